@@ -4,21 +4,137 @@ Claude Code Hook: JSON Schema Validation
 Triggers on SubagentStop event to validate agent JSON outputs
 """
 
+import functools
+import heapq
+import importlib.util
 import json
+import mmap
 import sys
 import os
 import re
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Sequence, Tuple, Optional, Union
 
-# Try to import jsonschema, provide helpful error if missing
+# orjson parses noticeably faster than the stdlib; both accept bytes, and
+# orjson.JSONDecodeError subclasses json.JSONDecodeError (lineno/colno included)
 try:
-    import jsonschema
-    from jsonschema import validate, ValidationError, Draft7Validator
+    import orjson
+    _json_loads = orjson.loads
 except ImportError:
-    print("ERROR: jsonschema package not installed", file=sys.stderr)
-    print("Install with: pip3 install jsonschema", file=sys.stderr)
-    sys.exit(2)
+    _json_loads = json.loads
+
+
+# fastjsonschema generates a Python validator per schema and is used for the
+# pass/fail check; jsonschema is the fallback and produces the full error report.
+# Both are imported on first use: most runs have no JSON files to validate, and
+# jsonschema is only needed once a file has failed.
+@functools.lru_cache(maxsize=None)
+def _import_fastjsonschema() -> Any:
+    """Return the fastjsonschema module, or None if it isn't installed"""
+    try:
+        import fastjsonschema
+    except ImportError:
+        return None
+    return fastjsonschema
+
+
+@functools.lru_cache(maxsize=None)
+def _import_draft7_validator() -> Any:
+    """Return jsonschema's Draft7Validator class, or None if jsonschema isn't installed"""
+    try:
+        from jsonschema import Draft7Validator
+    except ImportError:
+        return None
+    return Draft7Validator
+
+
+def _require_schema_validator() -> None:
+    """Exit with an install hint if neither validator library is available"""
+    if _import_fastjsonschema() is None and _import_draft7_validator() is None:
+        print("ERROR: no JSON schema validator installed", file=sys.stderr)
+        print("Install with: pip3 install fastjsonschema jsonschema", file=sys.stderr)
+        sys.exit(2)
+
+
+# Precompiled patterns (compiled once at import instead of on every call)
+# Exclude common directories that shouldn't be validated
+_EXCLUDE_PATTERNS = [
+    r"node_modules/",
+    r"\.next/",
+    r"dist/",
+    r"build/",
+    r"target/",
+    r"\.git/",
+    r"package-lock\.json$",
+    r"pnpm-lock\.json$",
+    r"yarn\.lock$",
+]
+_EXCLUDE_RE = re.compile("|".join(f"(?:{pattern})" for pattern in _EXCLUDE_PATTERNS))
+
+# Include files in tasks/, .claude/schemas/, or root-level project JSON files.
+# The schema-bearing file names are tried first as named groups, so a single
+# match yields both relevance and the schema implied by the file name. Matching
+# is case-sensitive as for relevance; other casings under tasks/ get their schema
+# from _get_schema_from_filename.
+_CLASSIFY_RE = re.compile(
+    r"(?:.*/)?(?:"
+    r"(?P<task>[^/]+_TaskList\.json)"
+    r"|(?P<plan>[^/]+_plan\.json)"
+    r"|(?P<analysis>[^/]+_CodebaseAnalysis\.json)"
+    r")$"
+    r"|.*tasks/.*\.json$"
+    r"|.*\.claude/schemas/.*\.json$"
+)
+_CLASSIFY_GROUP_SCHEMAS = {
+    "task": "task-file.json",
+    "plan": "plan-file.json",
+    "analysis": "plan-file.json",
+}
+
+# Transcripts smaller than this are read into memory rather than mmap'd
+_MMAP_MIN_SIZE = 64 * 1024
+
+# Transcript patterns are bytes so they can scan the mmap'd file directly
+# Pattern matches: "file_path": "/path/to/file.json"
+_FILE_PATH_KEY = b'"file_path"'
+_FILE_PATH_RE = re.compile(rb'"file_path":\s*"([^"]+\.json)"')
+_SUBAGENT_RE = re.compile(rb'"subagent_type":\s*"([^"]+)"')
+
+
+# Only the first few errors (ordered by location) are reported per file
+_MAX_REPORTED_ERRORS = 10
+
+
+def _error_sort_key(error: Any) -> Tuple[Tuple[bool, Union[int, str]], ...]:
+    """Order errors by path; tagging str vs int parts keeps mixed paths comparable"""
+    return tuple((isinstance(p, str), p) for p in error.path)
+
+
+def _fmt_path(path: Iterable[Union[int, str]]) -> str:
+    """Render an error path as root.key[0].key"""
+    parts = ["root"]
+    append = parts.append
+    for p in path:
+        if isinstance(p, int):
+            append(f"[{p}]")
+        else:
+            append(f".{p}")
+    return "".join(parts)
+
+
+class _SchemaError(NamedTuple):
+    """Mirror of the jsonschema ValidationError fields used in the error report"""
+    path: List[Union[int, str]]
+    message: str
+    validator: str
+    validator_value: Any
+
+
+def _from_fast_error(error: Any) -> _SchemaError:
+    """Convert a fastjsonschema error (path is ["data", "tasks", "1", ...]) into a _SchemaError"""
+    path = [int(p) if p.isdigit() else p for p in error.path[1:]]
+    return _SchemaError(path, error.message, error.rule, error.rule_definition)
 
 
 class AgentJSONValidator:
@@ -26,32 +142,46 @@ class AgentJSONValidator:
 
     def __init__(self, project_dir: str):
         self.project_dir = Path(project_dir)
+        self._project_root = os.fspath(self.project_dir)
+        # Absolute, with a trailing separator, for the "inside the project" prefix check
+        self._project_prefix = os.path.join(os.path.abspath(self._project_root), "")
+        # Symlink-resolved form of the same prefix, computed only when the string check fails
+        self._project_real_prefix: Optional[str] = None
         self.schemas_dir = self.project_dir / ".claude" / "schemas"
         self.hooks_dir = self.project_dir / ".claude" / "hooks"
         self.agent_schema_map = self._load_agent_schema_map()
+        # Top-level schema files, indexed by _get_schema_path on first use
+        self._schema_paths: Optional[Dict[str, Path]] = None
+        # Several files in one SubagentStop usually share a schema
+        self._schema_bytes: Dict[str, Optional[bytes]] = {}
+        self._schema_cache: Dict[str, Dict] = {}
+        self._validator_cache: Dict[str, "Draft7Validator"] = {}
+        self._compiled_cache: Dict[str, Callable[[Any], Any]] = {}
+        # Metaschema check result per schema name (None = passed), failures included
+        self._schema_check_errors: Dict[str, Optional[Exception]] = {}
+        # Files actually checked against a schema (skipped files aren't counted)
+        self.validated_count = 0
 
     def _load_agent_schema_map(self) -> Dict[str, str]:
         """Load agent-to-schema mapping from config file"""
         map_file = self.hooks_dir / "agent_schema_map.json"
         if map_file.exists():
             try:
-                with open(map_file, 'r') as f:
-                    return json.load(f)
+                with open(map_file, 'rb') as f:
+                    return _json_loads(f.read())
             except Exception as e:
                 print(f"Warning: Could not load agent_schema_map.json: {e}", file=sys.stderr)
         return {}
 
     def _get_schema_from_filename(self, filename: str) -> Optional[str]:
-        """Match file name patterns to schema files"""
-        patterns = {
-            r".*_TaskList\.json$": "task-file.json",
-            r".*_plan\.json$": "plan-file.json",
-            r".*_CodebaseAnalysis\.json$": "plan-file.json",
-        }
-
-        for pattern, schema_name in patterns.items():
-            if re.match(pattern, filename, re.IGNORECASE):
-                return schema_name
+        """Match file name patterns to schema files (case-insensitive suffixes)"""
+        fn = filename.lower()
+        if fn.endswith("_tasklist.json"):
+            return "task-file.json"
+        if fn.endswith("_plan.json"):
+            return "plan-file.json"
+        if fn.endswith("_codebaseanalysis.json"):
+            return "plan-file.json"
         return None
 
     def _get_schema_from_agent(self, agent_name: str) -> Optional[str]:
@@ -71,101 +201,317 @@ class AgentJSONValidator:
 
         return default_mappings.get(agent_name)
 
+    def _get_schema_path(self, schema_name: str) -> Optional[Path]:
+        """
+        Resolve a schema name to its file. Top-level schemas come from a single
+        directory listing taken on first use; other names (e.g. "v2/custom.json"
+        from agent_schema_map.json) are resolved relative to the schemas directory.
+        """
+        if self._schema_paths is None:
+            self._schema_paths = {p.name: p for p in self.schemas_dir.glob("*.json")}
+
+        schema_path = self._schema_paths.get(schema_name)
+        if schema_path is None:
+            schema_path = self.schemas_dir / schema_name
+            if not schema_path.exists():
+                return None
+        return schema_path
+
+    def _read_schema_bytes(self, schema_name: str) -> Optional[bytes]:
+        """Read a schema file once per run; its bytes also key the generated validator cache"""
+        if schema_name not in self._schema_bytes:
+            schema_bytes = None
+            schema_path = self._get_schema_path(schema_name)
+            if schema_path is not None:
+                try:
+                    with open(schema_path, 'rb') as f:
+                        schema_bytes = f.read()
+                except Exception as e:
+                    print(f"Error loading schema {schema_name}: {e}", file=sys.stderr)
+            self._schema_bytes[schema_name] = schema_bytes
+        return self._schema_bytes[schema_name]
+
     def _load_schema(self, schema_name: str) -> Optional[Dict]:
-        """Load a JSON schema file"""
-        schema_path = self.schemas_dir / schema_name
-        if not schema_path.exists():
+        """Load a JSON schema file (cached per schema name)"""
+        if schema_name in self._schema_cache:
+            return self._schema_cache[schema_name]
+
+        schema_bytes = self._read_schema_bytes(schema_name)
+        if schema_bytes is None:
             return None
 
         try:
-            with open(schema_path, 'r') as f:
-                return json.load(f)
+            schema = _json_loads(schema_bytes)
         except Exception as e:
             print(f"Error loading schema {schema_name}: {e}", file=sys.stderr)
             return None
 
-    def _extract_json_files_from_transcript(self, transcript_path: str) -> List[Tuple[str, str]]:
+        self._schema_cache[schema_name] = schema
+        return schema
+
+    def _get_compiled(self, schema_name: str) -> Optional[Callable[[Any], Any]]:
         """
-        Extract JSON files written during agent execution from transcript.
-        Returns list of (operation, file_path) tuples
+        Return the fastjsonschema validator for the schema, compiled once per schema name.
+        Reuses the generated module in hooks/_compiled/ when it was generated from the
+        same schema bytes and fastjsonschema release, otherwise regenerates it.
         """
-        json_files = []
+        fastjsonschema = _import_fastjsonschema()
+        if fastjsonschema is None:
+            return None
 
-        if not os.path.exists(transcript_path):
-            return json_files
+        compiled = self._compiled_cache.get(schema_name)
+        if compiled is None:
+            schema_bytes = self._read_schema_bytes(schema_name)
+            if schema_bytes is None:
+                return None
+            import hashlib  # Only needed once a JSON file is actually validated
+            schema_key = f"{hashlib.sha256(schema_bytes).hexdigest()}-{fastjsonschema.VERSION}"
+
+            compiled = self._import_compiled(schema_name, schema_key)
+            if compiled is None:
+                schema = self._load_schema(schema_name)
+                if not schema:
+                    return None
+                # Checked before generation, so a cached module implies a checked schema
+                self._check_schema(schema_name, schema)
+                try:
+                    compiled = self._generate_compiled(schema_name, schema, schema_key)
+                except fastjsonschema.JsonSchemaDefinitionException as e:
+                    print(f"Warning: Could not compile schema {schema_name}: {e}", file=sys.stderr)
+                    return None
+            self._compiled_cache[schema_name] = compiled
+        return compiled
+
+    def _compiled_module_path(self, schema_name: str) -> str:
+        """Path of the generated validator module for a schema (task-file.json -> validator_task_file.py)"""
+        stem = re.sub(r"\W", "_", os.path.splitext(schema_name)[0])
+        return os.path.join(self.hooks_dir, "_compiled", f"validator_{stem}.py")
+
+    def _import_compiled(self, schema_name: str, schema_key: str) -> Optional[Callable[[Any], Any]]:
+        """Import the generated validator if its SCHEMA_KEY header matches schema_key"""
+        module_path = self._compiled_module_path(schema_name)
+        try:
+            # Compare the header line before executing anything
+            with open(module_path, 'rb') as f:
+                if f.readline().rstrip() != f'SCHEMA_KEY = "{schema_key}"'.encode():
+                    return None  # Different schema bytes or fastjsonschema release
+
+            module_name = os.path.splitext(os.path.basename(module_path))[0]
+            spec = importlib.util.spec_from_file_location(module_name, module_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        except Exception:
+            return None  # Missing or unusable, regenerate
+
+        if getattr(module, "SCHEMA_KEY", None) != schema_key:
+            return None  # Replaced between the header check and the import
+        validate = getattr(module, "validate", None)
+        return validate if callable(validate) else None
+
+    def _generate_compiled(self, schema_name: str, schema: Dict, schema_key: str) -> Callable[[Any], Any]:
+        """
+        Generate validator code for the schema once, run it, and store it in
+        hooks/_compiled/ for later runs. Storing is skipped silently if the
+        directory isn't writable; the validator is still used for this run.
+        """
+        fastjsonschema = _import_fastjsonschema()
+        code = fastjsonschema.compile_to_code(schema)
+        module_path = self._compiled_module_path(schema_name)
+
+        try:
+            # The entry function is named after the schema's $id when it has one
+            entry = fastjsonschema.RefResolver.from_schema(schema, store={}).get_scope_name()
+            code = f'SCHEMA_KEY = "{schema_key}"\n{code}\n\nvalidate = {entry}\n'
+            namespace: Dict[str, Any] = {}
+            exec(compile(code, module_path, "exec"), namespace)
+            compiled = namespace["validate"]
+        except Exception:
+            # Unexpected generated layout: use fastjsonschema's own loader, uncached
+            return fastjsonschema.compile(schema)
 
         try:
-            with open(transcript_path, 'r') as f:
-                content = f.read()
+            os.makedirs(os.path.dirname(module_path), exist_ok=True)
+            tmp_path = f"{module_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(code)
+            os.replace(tmp_path, module_path)
+        except OSError:
+            pass
 
-            # Look for Write and Edit tool uses with file_path containing .json
-            # Pattern matches: "file_path": "/path/to/file.json"
-            file_pattern = r'"file_path":\s*"([^"]+\.json)"'
-            matches = re.findall(file_pattern, content)
+        return compiled
 
-            for file_path in matches:
-                # Only include relevant JSON files (not node_modules, dist, etc.)
-                if self._is_relevant_json_file(file_path):
-                    json_files.append(("write", file_path))
+    def _get_validator(self, schema_name: str) -> Optional["Draft7Validator"]:
+        """
+        Return a Draft7Validator for the schema, built once per schema name.
+        Raises SchemaError if the schema itself is invalid
+        """
+        Draft7Validator = _import_draft7_validator()
+        if Draft7Validator is None:
+            return None
 
+        validator = self._validator_cache.get(schema_name)
+        if validator is None:
+            schema = self._load_schema(schema_name)
+            if not schema:
+                return None
+            self._check_schema(schema_name, schema)
+            validator = Draft7Validator(schema)
+            self._validator_cache[schema_name] = validator
+        return validator
+
+    def _check_schema(self, schema_name: str, schema: Dict) -> None:
+        """
+        Check the schema against the Draft 7 metaschema once per schema name
+        (no-op without jsonschema). A failure is cached and re-raised on later calls.
+        """
+        if schema_name not in self._schema_check_errors:
+            error = None
+            Draft7Validator = _import_draft7_validator()
+            if Draft7Validator is not None:
+                try:
+                    Draft7Validator.check_schema(schema)
+                except Exception as e:
+                    error = e
+            self._schema_check_errors[schema_name] = error
+
+        error = self._schema_check_errors[schema_name]
+        if error is not None:
+            raise error
+
+    @contextmanager
+    def _open_transcript(self, transcript_path: str) -> Iterator[Union[bytes, mmap.mmap]]:
+        """
+        Memory-map the transcript so scans run against the page cache without
+        copying or decoding the whole file. Transcripts under _MMAP_MIN_SIZE are
+        read directly. Yields b"" if it can't be opened.
+        """
+        if not transcript_path or not os.path.exists(transcript_path):
+            yield b""
+            return
+
+        # Keep every read step in the try, but yield outside it so errors raised
+        # by the caller's scan are not mistaken for transcript read failures
+        mm = None
+        try:
+            with open(transcript_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < _MMAP_MIN_SIZE:
+                    # Small (or empty, which can't be mapped) transcripts: a plain read is cheaper
+                    content = f.read()
+                else:
+                    # The mapping stays valid after the file is closed
+                    content = mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
         except Exception as e:
-            print(f"Warning: Could not parse transcript: {e}", file=sys.stderr)
-
-        return list(set(json_files))  # Remove duplicates
-
-    def _is_relevant_json_file(self, file_path: str) -> bool:
-        """Check if JSON file is relevant for validation"""
-        # Exclude common directories that shouldn't be validated
-        exclude_patterns = [
-            r"node_modules/",
-            r"\.next/",
-            r"dist/",
-            r"build/",
-            r"target/",
-            r"\.git/",
-            r"package-lock\.json$",
-            r"pnpm-lock\.json$",
-            r"yarn\.lock$",
-        ]
+            print(f"Warning: Could not read transcript: {e}", file=sys.stderr)
+            yield b""
+            return
 
-        for pattern in exclude_patterns:
-            if re.search(pattern, file_path):
-                return False
-
-        # Include files in tasks/, .claude/schemas/, or root-level project JSON files
-        include_patterns = [
-            r"tasks/.*\.json$",
-            r"\.claude/schemas/.*\.json$",
-            r"[^/]+_TaskList\.json$",
-            r"[^/]+_plan\.json$",
-            r"[^/]+_CodebaseAnalysis\.json$",
-        ]
+        if mm is None:
+            yield content
+            return
 
-        for pattern in include_patterns:
-            if re.search(pattern, file_path):
-                return True
+        with mm:
+            yield mm
+
+    def _extract_json_files_from_content(
+        self, content: Union[bytes, mmap.mmap]
+    ) -> List[Tuple[str, str, Optional[str]]]:
+        """
+        Extract JSON files written during agent execution from transcript content.
+        Returns list of (operation, file_path, schema_from_file) tuples
+        """
+        json_files = []
+        seen: Dict[str, None] = {}  # Dedup while keeping transcript order
 
-        return False
+        # No Write/Edit tool use at all: skip the regex engine entirely
+        if content.find(_FILE_PATH_KEY) == -1:
+            return json_files
 
-    def validate_file(self, file_path: str, agent_name: str) -> Tuple[bool, List[str]]:
+        # Look for Write and Edit tool uses with file_path containing .json.
+        # finditer streams matches so only unique paths are ever held in memory
+        for match in _FILE_PATH_RE.finditer(content):
+            file_path = match.group(1).decode("utf-8", "replace")
+            if file_path in seen:
+                continue
+            seen[file_path] = None
+            # Only include relevant JSON files (not node_modules, dist, etc.)
+            is_relevant, schema_from_file = self._classify_json_file(file_path)
+            if is_relevant:
+                json_files.append(("write", file_path, schema_from_file))
+
+        return json_files
+
+    def _classify_json_file(self, file_path: str) -> Tuple[bool, Optional[str]]:
         """
-        Validate a JSON file against its schema.
-        Returns (is_valid, error_messages)
+        Check if JSON file is relevant for validation.
+        Returns (is_relevant, schema name implied by the file name or None)
         """
-        errors = []
+        if _EXCLUDE_RE.search(file_path):
+            return False, None
 
-        # Convert to Path object
-        file_path_obj = Path(file_path)
-        if not file_path_obj.is_absolute():
-            file_path_obj = self.project_dir / file_path
+        match = _CLASSIFY_RE.match(file_path)
+        if match is None:
+            return False, None
+        return True, _CLASSIFY_GROUP_SCHEMAS.get(match.lastgroup)
+
+    def _collect_validation_errors(self, schema_name: str, json_data: Any) -> List[Any]:
+        """
+        Validate json_data against the schema.
+        Returns the errors in validator order (empty list when valid)
+        """
+        _require_schema_validator()
+
+        fast_error = None
+        compiled = self._get_compiled(schema_name)
+        if compiled is not None:
+            try:
+                compiled(json_data)
+                return []
+            except _import_fastjsonschema().JsonSchemaValueException as e:
+                fast_error = e
+
+        # Failed (or fastjsonschema unavailable): jsonschema has the final say when
+        # installed. fastjsonschema is stricter (it enforces "format", and "$" in
+        # patterns acts as \Z), so an empty result here means the file is valid.
+        validator = self._get_validator(schema_name)
+        if validator is not None:
+            return list(validator.iter_errors(json_data))
+
+        if fast_error is None:
+            raise RuntimeError(f"No usable validator for schema {schema_name}")
+
+        # No jsonschema: fastjsonschema stops at the first error, so that's all we can report
+        return [_from_fast_error(fast_error)]
+
+    def validate_file(
+        self, file_path: str, agent_name: str, schema_from_file: Optional[str] = None
+    ) -> Tuple[bool, Sequence[str]]:
+        """
+        Validate a JSON file against its schema.
+        schema_from_file skips the file name lookup when the caller already classified the path.
+        Returns (is_valid, error_messages); valid files share the empty tuple
+        """
+        # Resolve against the project with plain string ops (no Path objects per file)
+        if not os.path.isabs(file_path):
+            file_path = os.path.join(self._project_root, file_path)
+
+        # Paths outside the project are never ours to validate; skip the stat
+        if not os.path.abspath(file_path).startswith(self._project_prefix):
+            # The string check misses symlinks and aliases like /var -> /private/var
+            if self._project_real_prefix is None:
+                self._project_real_prefix = os.path.normcase(
+                    os.path.join(os.path.realpath(self._project_root), "")
+                )
+            if not os.path.normcase(os.path.realpath(file_path)).startswith(self._project_real_prefix):
+                return True, ()
 
         # Check if file exists
-        if not file_path_obj.exists():
-            return True, []  # File doesn't exist, skip validation
+        if not os.path.exists(file_path):
+            return True, ()  # File doesn't exist, skip validation
 
         # Determine schema using dual matching strategy
-        filename = file_path_obj.name
-        schema_from_file = self._get_schema_from_filename(filename)
+        filename = os.path.basename(file_path)
+        if schema_from_file is None:
+            schema_from_file = self._get_schema_from_filename(filename)
         schema_from_agent = self._get_schema_from_agent(agent_name)
 
         # Choose schema (prefer file pattern, then agent)
@@ -173,7 +519,9 @@ class AgentJSONValidator:
 
         if not schema_name:
             # No schema mapping found, skip validation
-            return True, []
+            return True, ()
+
+        errors: List[str] = []
 
         # Verify both methods agree if both provided a schema
         if schema_from_file and schema_from_agent and schema_from_file != schema_from_agent:
@@ -183,15 +531,14 @@ class AgentJSONValidator:
             )
 
         # Load schema
-        schema = self._load_schema(schema_name)
-        if not schema:
+        if not self._load_schema(schema_name):
             errors.append(f"Could not load schema: {schema_name}")
             return False, errors
 
         # Load JSON file
         try:
-            with open(file_path_obj, 'r') as f:
-                json_data = json.load(f)
+            with open(file_path, 'rb') as f:
+                json_data = _json_loads(f.read())
         except json.JSONDecodeError as e:
             errors.append(f"Invalid JSON syntax in {filename}:")
             errors.append(f"  Line {e.lineno}, Column {e.colno}: {e.msg}")
@@ -201,17 +548,18 @@ class AgentJSONValidator:
             return False, errors
 
         # Validate against schema
+        self.validated_count += 1
         try:
-            validator = Draft7Validator(schema)
-            validation_errors = sorted(validator.iter_errors(json_data), key=lambda e: e.path)
+            validation_errors = self._collect_validation_errors(schema_name, json_data)
 
             if validation_errors:
                 errors.append(f"Schema validation failed for {filename} (schema: {schema_name}):")
                 errors.append("")
 
-                for i, error in enumerate(validation_errors[:10], 1):  # Limit to 10 errors
-                    path = "root" + "".join(f"[{p!r}]" if isinstance(p, int) else f".{p}" for p in error.path)
-                    errors.append(f"  {i}. At {path}:")
+                # Select the first errors by path without sorting the whole list
+                reported = heapq.nsmallest(_MAX_REPORTED_ERRORS, validation_errors, key=_error_sort_key)
+                for i, error in enumerate(reported, 1):
+                    errors.append(f"  {i}. At {_fmt_path(error.path)}:")
                     errors.append(f"     {error.message}")
 
                     if error.validator == "required":
@@ -222,8 +570,8 @@ class AgentJSONValidator:
                         errors.append(f"     Allowed values: {error.validator_value}")
                     errors.append("")
 
-                if len(validation_errors) > 10:
-                    errors.append(f"  ... and {len(validation_errors) - 10} more errors")
+                if len(validation_errors) > _MAX_REPORTED_ERRORS:
+                    errors.append(f"  ... and {len(validation_errors) - _MAX_REPORTED_ERRORS} more errors")
 
                 return False, errors
 
@@ -231,14 +579,14 @@ class AgentJSONValidator:
             errors.append(f"Validation error: {str(e)}")
             return False, errors
 
-        return True, []
+        return True, ()
 
 
 def main():
     """Main hook entry point"""
     # Read hook input from stdin
     try:
-        hook_input = json.load(sys.stdin)
+        hook_input = _json_loads(sys.stdin.buffer.read())
     except json.JSONDecodeError:
         print("Error: Could not parse hook input JSON", file=sys.stderr)
         sys.exit(0)  # Non-blocking error
@@ -252,23 +600,18 @@ def main():
     # Try to infer agent name from transcript or environment
     agent_name = os.environ.get("CLAUDE_AGENT_NAME", "unknown")
 
-    # If transcript path available, try to extract agent name from it
-    if transcript_path and os.path.exists(transcript_path):
-        try:
-            with open(transcript_path, 'r') as f:
-                content = f.read()
-                # Look for agent invocations in transcript
-                agent_match = re.search(r'"subagent_type":\s*"([^"]+)"', content)
-                if agent_match:
-                    agent_name = agent_match.group(1)
-        except:
-            pass
-
     # Initialize validator
     validator = AgentJSONValidator(project_dir)
 
-    # Extract JSON files from transcript
-    json_files = validator._extract_json_files_from_transcript(transcript_path)
+    # Map the transcript once; both scans below share the same buffer
+    with validator._open_transcript(transcript_path) as content:
+        # Look for agent invocations in transcript
+        agent_match = _SUBAGENT_RE.search(content)
+        if agent_match:
+            agent_name = agent_match.group(1).decode("utf-8", "replace")
+
+        # Extract JSON files from transcript
+        json_files = validator._extract_json_files_from_content(content)
 
     if not json_files:
         # No JSON files found, pass through
@@ -276,10 +619,10 @@ def main():
 
     # Validate each file
     all_valid = True
-    all_errors = []
+    all_errors: List[str] = []
 
-    for operation, file_path in json_files:
-        is_valid, errors = validator.validate_file(file_path, agent_name)
+    for operation, file_path, schema_from_file in json_files:
+        is_valid, errors = validator.validate_file(file_path, agent_name, schema_from_file)
 
         if not is_valid:
             all_valid = False
@@ -287,28 +630,29 @@ def main():
             all_errors.append("")  # Blank line between files
 
     if not all_valid:
-        # Print errors to stderr (will be fed back to Claude)
-        print("=" * 70, file=sys.stderr)
-        print("JSON SCHEMA VALIDATION FAILED", file=sys.stderr)
-        print("=" * 70, file=sys.stderr)
-        print("", file=sys.stderr)
-        print("Agent:", agent_name, file=sys.stderr)
-        print("", file=sys.stderr)
-
-        for error_line in all_errors:
-            print(error_line, file=sys.stderr)
-
-        print("=" * 70, file=sys.stderr)
-        print("Please fix the validation errors and try again.", file=sys.stderr)
-        print("Refer to the schema file in .claude/schemas/ for requirements.", file=sys.stderr)
-        print("=" * 70, file=sys.stderr)
+        # Print errors to stderr (will be fed back to Claude) in a single write
+        separator = "=" * 70
+        lines = [
+            separator,
+            "JSON SCHEMA VALIDATION FAILED",
+            separator,
+            "",
+            f"Agent: {agent_name}",
+            "",
+            *all_errors,
+            separator,
+            "Please fix the validation errors and try again.",
+            "Refer to the schema file in .claude/schemas/ for requirements.",
+            separator,
+        ]
+        sys.stderr.write("\n".join(lines) + "\n")
 
         # Exit code 2 = blocking error, feeds stderr back to Claude
         sys.exit(2)
 
     # All validations passed
-    if json_files:
-        print(f"✓ Validated {len(json_files)} JSON file(s) successfully", file=sys.stderr)
+    if validator.validated_count:
+        print(f"✓ Validated {validator.validated_count} JSON file(s) successfully", file=sys.stderr)
 
     sys.exit(0)
 